@@ -286,6 +286,36 @@ async def chat_endpoint(message: ChatMessage):
             detail=f"An error occurred: {str(e)}"
         )
 
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(message: ChatMessage):
+    """Stream the RAG response as plain-text chunks instead of blocking on the full answer."""
+    try:
+        # Generate thread_id if not provided
+        thread_id = message.thread_id or f"api-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+        # Extract project context if available
+        project_context = extract_project_context(message.content)
+
+        # stream_answer is a sync generator; StreamingResponse iterates it in
+        # a threadpool so the event loop is not blocked
+        return StreamingResponse(
+            rag_system.stream_answer(
+                query=message.content,
+                thread_id=thread_id,
+                mode=message.mode,
+                project_context=project_context,
+                attached_images=message.attached_images
+            ),
+            media_type="text/plain"
+        )
+
+    except Exception as e:
+        print(f"Error in chat stream endpoint: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"An error occurred: {str(e)}"
+        )
+
 # Add this new function to extract search results and format as JSON
 def extract_search_results_json(response: str) -> Optional[dict]:
     """
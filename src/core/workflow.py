@@ -71,6 +71,7 @@ For questions about:
 - When users request notifications, use send_sms or make_call to follow up.
 - When users want to hear information, use speak_text to convert your response to audio
 - When users want images created, use generate_image to create visuals based on descriptions
+- When several independent actions are needed in one turn, use the batch tool to run them in parallel
 """
         base_prompt += tools_prompt
 
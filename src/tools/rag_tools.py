@@ -1,6 +1,7 @@
 # src/tools/rag_tools.py
 
 from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
 from langchain.tools import tool
 from src.tools.web_scraper import WebScraper
 from src.tools.web_searcher import WebSearcher
@@ -156,14 +157,58 @@ class RAGTools:
                 return f"Error processing image: {error}"
             return f"Image processed successfully. Use the following token to reference this image: [IMAGE:{processed_image[:30]}...]"
         
+        # Name lookup for the batch tool below
+        tools_by_name = {
+            t.name: t for t in [
+                search_web,
+                scrape_webpage,
+                send_sms,
+                make_call,
+                speak_text,
+                generate_image,
+                analyze_image,
+                process_image
+            ]
+        }
+
+        @tool
+        def batch(invocations: List[Dict]) -> List[str]:
+            """
+            Run several independent tools in parallel with a single call.
+
+            Use this instead of separate tool calls when multiple unrelated
+            actions are needed in one turn (e.g. a web search plus an SMS).
+
+            Args:
+                invocations: List of {"tool_name": ..., "arguments": {...}} dicts
+
+            Returns:
+                The result of each invocation, in the same order
+            """
+            def run_one(invocation):
+                name = invocation.get("tool_name")
+                tool_impl = tools_by_name.get(name)
+                if tool_impl is None:
+                    return f"Error: unknown tool '{name}'"
+                try:
+                    return str(tool_impl.invoke(invocation.get("arguments", {})))
+                except Exception as e:
+                    return f"Error running {name}: {str(e)}"
+
+            # Fan the invocations out to a thread pool so N tool calls take
+            # roughly the time of the slowest one instead of their sum
+            with ThreadPoolExecutor(max_workers=max(len(invocations), 1)) as pool:
+                return list(pool.map(run_one, invocations))
+
         # Return all tools
         return [
-            search_web, 
-            scrape_webpage, 
-            send_sms, 
-            make_call, 
-            speak_text, 
-            generate_image, 
-            analyze_image, 
-            process_image
+            search_web,
+            scrape_webpage,
+            send_sms,
+            make_call,
+            speak_text,
+            generate_image,
+            analyze_image,
+            process_image,
+            batch
         ]
@@ -7,10 +7,15 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager  # Add this for driver management
 from datetime import datetime
+import threading
 
 class WebScraper:
     def __init__(self):
         self.driver = None
+        # One Chrome session is shared across calls; the lock stops
+        # concurrent tool invocations (batch tool, graph fan-out) from
+        # racing navigation against content extraction
+        self._driver_lock = threading.Lock()
         self.start_driver()
 
     def start_driver(self):
@@ -34,8 +39,11 @@ class WebScraper:
 
     def scrape_url(self, url: str) -> str:
         try:
-            self.driver.get(url)
-            content = self.extract_content(url)
+            # Hold the lock across navigate + extract so a parallel scrape
+            # can't swap the page out from under us
+            with self._driver_lock:
+                self.driver.get(url)
+                content = self.extract_content(url)
             return content
         except Exception as e:
             print(f"Error scraping {url}: {str(e)}")
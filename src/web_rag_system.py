@@ -1,31 +1,120 @@
-from typing import Dict, Optional, Literal
+from typing import Dict, Optional
+from collections import defaultdict
+from queue import Queue
+from threading import Thread
 from langchain_openai import ChatOpenAI
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import START, MessagesState, StateGraph, END
 from langgraph.prebuilt import ToolNode
+from langgraph.types import Send
 
 from src.tools.rag_tools import RAGTools
 from src.core.vector_store import VectorStore
 from src.core.workflow import RAGWorkflow
 from src.tools.image_tools import ImageTools
+import io
+import json
 import re
+import time
+import traceback
+import httpx
+import numpy as np
+from openai import OpenAI
 from urllib.parse import urlparse
 
+# simsimd provides fused SIMD cosine kernels (AVX2/AVX-512/NEON); fall back
+# to a plain numpy dot product when it isn't installed
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+# orjson decodes large JSON bodies 2-3x faster than the stdlib; fall back
+# to the response's built-in json() when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Create LangChain agent
 from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from src.tools import RAGTools
 
+# Regexes used on the per-query hot path, compiled once at import time
+# instead of being re-parsed inside get_answer/_extract_* on every call.
+# The image/SMS/call intents are a single alternation with named groups so
+# the query is scanned once and the branch is picked via match.lastgroup.
+_INTENT_RE = re.compile(
+    r"(?P<img>(?:generate|create|make|draw)\s.*?image of)"
+    r"|(?P<sms>(?:send|text|sms)\s.*?(?:message|sms|text))"
+    r"|(?P<call>(?:call|phone|ring)\s)",
+    re.IGNORECASE
+)
+_INTENT_KEYWORDS = ("image", "sms", "text", "send", "call", "phone", "ring")
+_PHONE_RE = re.compile(r'(\+?[\d\s\-\(\)]{10,})')
+_QUOTE_RE = re.compile(r'"([^"]*)"')
+_SAY_RE = re.compile(r'say(?:ing)?\s+(.+?)(?:$|\s+to\s+)')
+_SOURCE_RE = re.compile(r'(?:(?:\d+\.|\-|\*)\s*)?(?:\[?([^\]]+)\]?)?\s*(?:\()?(https?://[^\s\)]+)(?:\))?', re.IGNORECASE)
+_SEARCH_WEB_RE = re.compile(r"search_web", re.IGNORECASE)
+
+# Sentinel marking the end of a token stream (see stream_answer)
+_STREAM_DONE = object()
+
+# Fallback texts that must never enter the semantic cache; caching one
+# would replay a transient failure to every similar query for the life
+# of the process
+_UNCACHEABLE_OUTPUTS = (
+    "I couldn't generate a response. Please try again.",
+    "I apologize for the error in processing your request. Could you please rephrase your question?",
+)
+
+
+class _QueueTokenHandler(BaseCallbackHandler):
+    """Forwards streamed LLM tokens into a queue for stream_answer."""
+
+    def __init__(self, token_queue: Queue):
+        self.token_queue = token_queue
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        # Tool-call deltas arrive as empty content tokens; skip them
+        if token:
+            self.token_queue.put(token)
+
 
 class WebRAGSystem:
+    # Fixed attribute layout: drops the per-instance __dict__ and makes the
+    # many self.X lookups per query a little cheaper
+    __slots__ = (
+        'openai_api_key', 'rag_tools', 'vector_store', 'conversation_history',
+        '_http', 'llm', 'workflow', 'mode', 'tools', 'toolchain',
+        '_openai_http', '_llm_with_tools', 'memory', 'app',
+        'recursion_count', 'max_recursion',
+        '_sem_cache_matrix', '_sem_cache_answers', '_sem_cache_threshold',
+        '_sem_cache_max_entries', '_phone_cache',
+        '_static_prompt_suffix', '_mode_suffixes', '_agent_executor',
+    )
+
     def __init__(self, openai_api_key: str):
         self.openai_api_key = openai_api_key
         
         # Initialize core components
         self.rag_tools = RAGTools()
         self.vector_store = VectorStore(openai_api_key)
-        self.conversation_history = {}  # Initialize conversation history
+        # Conversation history keyed by thread_id; defaultdict removes the
+        # membership-check-then-create dance at every append site
+        self.conversation_history = defaultdict(list)
+
+        # Pooled HTTP client for the conversation-history API.
+        # Keep-alive connections avoid a fresh TCP handshake on every query,
+        # and the short timeout lets us fall back to in-memory history fast.
+        self._http = httpx.Client(
+            base_url="http://localhost:8000",
+            timeout=2.0,
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
         
         # Initialize LLM with vision capabilities
         self.llm = ChatOpenAI(
@@ -44,6 +133,23 @@ class WebRAGSystem:
         
         # Initialize tools
         self.tools = self._connect_llm_tools()
+
+        # Cache the agent LLM with tools bound once; rebuilding the client
+        # and re-validating every tool schema per request is pure overhead.
+        # The shared httpx client keeps connections to api.openai.com warm
+        # across requests instead of paying a TLS handshake per call.
+        self._openai_http = httpx.Client(
+            limits=httpx.Limits(max_keepalive_connections=64)
+        )
+        # streaming=True makes token callbacks fire for stream_answer; for
+        # blocking calls the full response is still assembled and returned
+        self._llm_with_tools = ChatOpenAI(
+            model="gpt-4o",
+            temperature=0.7,
+            openai_api_key=openai_api_key,
+            http_client=self._openai_http,
+            streaming=True
+        ).bind_tools(self.toolchain)
         
         # Initialize memory
         self.memory = MemorySaver()
@@ -53,20 +159,65 @@ class WebRAGSystem:
         # Track recursion to prevent infinite loops
         self.recursion_count = 0
         self.max_recursion = 20
+
+        # Semantic answer cache: near-duplicate queries skip the agent and
+        # LLM entirely. Query embeddings are row-stacked into one float32
+        # matrix so a lookup is a single matrix-vector product instead of a
+        # per-entry Python loop.
+        self._sem_cache_matrix = None  # (n, d) float32, unit-norm rows
+        self._sem_cache_answers = []
+        self._sem_cache_threshold = 0.95
+        self._sem_cache_max_entries = 512
+
+        # Memoized phone-number extraction per thread, keyed by history
+        # length so unchanged threads skip the regex scan entirely
+        self._phone_cache = {}
+
+        # Static system-prompt blocks are identical on every request; build
+        # them once here instead of a chain of concatenations per query
+        self._static_prompt_suffix = (
+            "\n\nIMPORTANT: When asked to send an SMS or make a call, use the appropriate tool (send_sms or make_call) directly. Do not hesitate to use these tools when explicitly requested."
+            "\n\nWhen using the search_web tool to respond to queries about news, events, or information:"
+            "\n1. Always find at least 5 relevant sources from diverse websites"
+            "\n2. Structure your response with a clear, well-organized summary of key findings"
+            "\n3. List all 5 sources with proper links at the end of your response"
+            "\n4. Prefer recent sources when available"
+            "\n5. Present information in a factual, balanced way, highlighting agreements and differences between sources"
+            "\n\nIMPORTANT: You have access to the full conversation history. Reference previous parts of the conversation when relevant and maintain continuity by referring to previous questions and answers."
+        )
+        self._mode_suffixes = {
+            "setup": "\nYou are in SETUP mode. Focus on helping the user configure systems, services, or applications. Provide detailed step-by-step instructions. When appropriate, suggest best practices for configuration.",
+            "explore": "\nYou are in EXPLORE mode. Focus on helping the user discover information and learn new things. Be comprehensive and educational in your responses.",
+        }
+
+        # Lazily built, reused agent executor (see _prepare_agent)
+        self._agent_executor = None
         
     def _connect_llm_tools(self):
         """Initialize tools for the LLM"""
         toolchain = self.rag_tools.get_tools()
+        self.toolchain = toolchain  # Cache the tool list for reuse in get_answer
         self.llm = self.llm.bind_tools(toolchain)
         
         # Set up tool node
         tools = ToolNode(toolchain)
         self.workflow.add_node('tools', tools)
         
-        def branch(state: MessagesState) -> Literal['tools', '__end__']:
+        def branch(state: MessagesState):
             latest = state['messages'][-1]
-            return 'tools' if hasattr(latest, 'tool_calls') and len(latest.tool_calls) > 0 else END
-            
+            tool_calls = getattr(latest, 'tool_calls', None)
+            if not tool_calls:
+                return END
+            if len(tool_calls) == 1:
+                return 'tools'
+            # Fan out independent tool calls so they execute concurrently
+            # instead of one at a time; each Send carries a single-call
+            # message and the results merge back via the messages reducer
+            return [
+                Send('tools', {'messages': [AIMessage(content='', tool_calls=[tool_call])]})
+                for tool_call in tool_calls
+            ]
+
         self.workflow.add_conditional_edges('rag_node', branch)
         self.workflow.add_edge('tools', 'rag_node')
         
@@ -127,8 +278,11 @@ class WebRAGSystem:
             # Get response from the LLM
             response = self.llm.invoke(messages)
             
-            # Format the search results better if they're present
-            if hasattr(response, 'content') and 'search_web' in str(response.content).lower():
+            # Format the search results better if they're present.
+            # A case-insensitive regex search avoids lowercasing a copy of
+            # the entire (potentially large) response body
+            content = response.content if isinstance(getattr(response, 'content', None), str) else str(getattr(response, 'content', ''))
+            if content and _SEARCH_WEB_RE.search(content):
                 # Extract and enhance search results formatting
                 response.content = self._enhance_search_results_formatting(response.content)
             
@@ -183,12 +337,13 @@ class WebRAGSystem:
         paragraphs = [p.strip() for p in summary.split('\n') if p.strip()]
         
         if len(paragraphs) >= 3:
-            # Good structure, format as key points
-            formatted = "**Summary of Key Findings:**\n\n"
+            # Good structure, format as key points (build a list and join
+            # once instead of quadratic += concatenation)
+            parts = ["**Summary of Key Findings:**\n"]
             for i, para in enumerate(paragraphs, 1):
                 if len(para) > 20:  # Only include substantial paragraphs
-                    formatted += f"{i}. {para}\n\n"
-            return formatted
+                    parts.append(f"{i}. {para}\n")
+            return "\n".join(parts) + "\n"
         else:
             # Not enough paragraphs, return as is with a header
             return f"**Summary:**\n\n{summary}"
@@ -198,73 +353,135 @@ class WebRAGSystem:
         Format the sources section to consistently show 5 sources in a clean format.
         """
         # Extract source URLs and titles
-        source_matches = re.findall(r'(?i)(?:(?:\d+\.|\-|\*)\s*)?(?:\[?([^\]]+)\]?)?\s*(?:\()?(https?://[^\s\)]+)(?:\))?', sources)
+        source_matches = _SOURCE_RE.findall(sources)
         
-        formatted_sources = ""
+        # Build the lines in a list and join once instead of quadratic +=
+        formatted_sources = []
         sources_seen = set()
         source_count = 0
-        
+        parsed_urls = {}  # Cache urlparse results so each URL is parsed once
+
         # Format each source
-        for i, (title, url) in enumerate(source_matches, 1):
-            if url in sources_seen:
+        for title, url in source_matches:
+            parsed = parsed_urls.get(url)
+            if parsed is None:
+                parsed = urlparse(url)
+                parsed_urls[url] = parsed
+
+            # Dedupe on (domain, path) so query-string variants of the same
+            # page (e.g. utm tracking parameters) don't count as distinct
+            dedupe_key = (parsed.netloc, parsed.path)
+            if dedupe_key in sources_seen:
                 continue
-                
-            sources_seen.add(url)
-            domain = urlparse(url).netloc
-            
+
+            sources_seen.add(dedupe_key)
+            domain = parsed.netloc
+
             # Clean up the title or use domain if missing
             if not title or len(title) < 3:
                 title = domain
-                
-            formatted_sources += f"{i}. [{title}]({url})\n"
+
+            # Number by emitted position, not match position, so skipped
+            # duplicates don't leave holes in the 1-5 sequence
             source_count += 1
-            
+            formatted_sources.append(f"{source_count}. [{title}]({url})")
+
             if source_count >= 5:
                 break
-        
+
         # If we don't have enough sources, add placeholders
         while source_count < 5:
             source_count += 1
-            formatted_sources += f"{source_count}. [Additional information not available]\n"
-        
-        return formatted_sources
+            formatted_sources.append(f"{source_count}. [Additional information not available]")
+
+        return "\n".join(formatted_sources) + "\n"
         
     def _extract_phone_number_from_history(self, thread_id: str) -> Optional[str]:
         """Extract phone number from conversation history"""
         if thread_id not in self.conversation_history:
             return None
-        
-        # Look for phone numbers in history
-        phone_pattern = r'(\+?[\d\s\-\(\)]{10,})'
-        
-        for msg in self.conversation_history[thread_id]:
+
+        history = self.conversation_history[thread_id]
+
+        # Long threads make this scan expensive; memoize the result keyed by
+        # history length so repeated lookups on an unchanged thread are O(1)
+        cached = self._phone_cache.get(thread_id)
+        if cached is not None and cached[0] == len(history):
+            return cached[1]
+
+        # Scan the history newest-first and stop at the first hit; a phone
+        # number is usually in the latest user turn, so the typical case is
+        # O(1) and search() stops at the first match within a message
+        phone_number = None
+        for msg in reversed(history):
             if hasattr(msg, 'content') and isinstance(msg.content, str):
-                matches = re.findall(phone_pattern, msg.content)
-                if matches:
-                    # Return the last matched phone number
-                    return matches[-1].strip()
-        
-        return None
+                match = _PHONE_RE.search(msg.content)
+                if match:
+                    phone_number = match.group(1).strip()
+                    break
+
+        self._phone_cache[thread_id] = (len(history), phone_number)
+        return phone_number
 
     def _extract_message_content(self, query: str) -> Optional[str]:
         """Extract message content from query"""
         # Look for quotes or patterns like "say X" or "saying X"
         
         # Try to find content in quotes
-        quote_pattern = r'"([^"]*)"'
-        quote_matches = re.findall(quote_pattern, query)
+        quote_matches = _QUOTE_RE.findall(query)
         if quote_matches:
             return quote_matches[0]
-        
+
         # Try to find content after "say" or "saying"
-        say_pattern = r'say(?:ing)?\s+(.+?)(?:$|\s+to\s+)'
-        say_matches = re.findall(say_pattern, query.lower())
+        say_matches = _SAY_RE.findall(query.lower())
         if say_matches:
             return say_matches[0]
         
         # If we can't extract a specific message, return a default
         return "Hello!"
-        
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Embed a query into a unit-norm float32 vector for cache lookups."""
+        vec = np.asarray(self.vector_store.embeddings.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec /= norm
+        return vec
+
+    def _semantic_cache_lookup(self, query_vec: np.ndarray) -> Optional[str]:
+        """Return the cached answer for a near-duplicate query, or None."""
+        if self._sem_cache_matrix is None:
+            return None
+
+        if simsimd is not None:
+            # Fused SIMD kernel computes dot products and norms in a single
+            # pass over memory instead of separate numpy ops
+            dists = np.asarray(
+                simsimd.cdist(query_vec.reshape(1, -1), self._sem_cache_matrix, metric="cosine")
+            ).ravel()
+            scores = 1.0 - dists
+        else:
+            # One matrix-vector product scores every cached query at once
+            scores = self._sem_cache_matrix @ query_vec
+        best = int(np.argmax(scores))
+        if scores[best] >= self._sem_cache_threshold:
+            return self._sem_cache_answers[best]
+        return None
+
+    def _semantic_cache_store(self, query_vec: np.ndarray, answer: str):
+        """Add a (query embedding, answer) pair to the semantic cache."""
+        # Keep the cache bounded; evicting would invalidate row indexes,
+        # so simply stop adding once full
+        if len(self._sem_cache_answers) >= self._sem_cache_max_entries:
+            return
+
+        self._sem_cache_answers.append(answer)
+        row = query_vec.reshape(1, -1)
+        if self._sem_cache_matrix is None:
+            self._sem_cache_matrix = row
+        else:
+            self._sem_cache_matrix = np.vstack([self._sem_cache_matrix, row])
+
     def generate_image_directly(self, prompt: str) -> str:
         """
         Generate an image directly without sending the full conversation context to OpenAI.
@@ -291,238 +508,266 @@ class WebRAGSystem:
         except Exception as e:
             return f"Error generating image: {str(e)}"
     
-    def get_answer(self, query: str, thread_id: str = None, mode: str = "explore", 
-                project_context: dict = None, image_context: str = None,
-                attached_images: list = None) -> str:
+    def _handle_direct_request(self, query: str, thread_id: str) -> Optional[str]:
         """
-        Get answer from the RAG system for a user query.
-        
-        Args:
-            query: User question
-            thread_id: Optional thread ID for conversation continuity
-            mode: Mode for the RAG system (explore, setup, etc.)
-            project_context: Optional project context information
-            image_context: Optional context from analyzed images
-            attached_images: Optional list of attached image data
-            
-        Returns:
-            Response from the system
+        Handle image/SMS/call requests directly without going through the agent.
+
+        Returns the response string if the query was handled, or None to let
+        the normal agent path take over.
         """
-        try:
-            # Check if this is a direct image generation request
-            image_request_pattern = r"(generate|create|make|draw) .*image of"
-            
-            if re.search(image_request_pattern, query.lower()):
-                # Extract the image description
-                description_start = query.lower().find("image of") + 8
-                if description_start > 8:  # Found "image of"
-                    image_description = query[description_start:].strip()
-                    # If the description ends with punctuation, remove it
-                    image_description = re.sub(r'[.!?]$', '', image_description)
-                    
-                    if image_description:
-                        # Call the direct image generation method
-                        return self.generate_image_directly(image_description)
-            
-            # Special handling for SMS requests
-            sms_pattern = r"(send|text|sms) .*(message|sms|text)"
-            if re.search(sms_pattern, query.lower()):
-                # Extract phone number and message
-                phone_number = None
-                message = None
-                
-                # Try to extract phone number from query
-                phone_pattern = r'(\+?[\d\s\-\(\)]{10,})'
-                phone_matches = re.findall(phone_pattern, query)
-                if phone_matches:
-                    phone_number = phone_matches[0].strip()
-                else:
-                    # Try to find phone number in conversation history
-                    phone_number = self._extract_phone_number_from_history(thread_id)
-                
-                # Extract message content
-                message = self._extract_message_content(query)
-                
-                if phone_number and message:
-                    # Get SMS tool
-                    rag_tools = RAGTools()
-                    tools = rag_tools.get_tools()
-                    for tool in tools:
-                        if tool.name == "send_sms":
-                            result = tool.invoke({"recipient": phone_number, "message": message})
-                            
-                            # Add to conversation history
-                            if thread_id not in self.conversation_history:
-                                self.conversation_history[thread_id] = []
-                            self.conversation_history[thread_id].append(HumanMessage(content=query))
-                            self.conversation_history[thread_id].append(AIMessage(
-                                content=f"✅ SMS sent to {phone_number} with message: '{message}'. {result}"
-                            ))
-                            
-                            return f"✅ SMS sent to {phone_number} with message: '{message}'. {result}"
-            
-            # Special handling for call requests
-            call_pattern = r"(call|phone|ring) .*"
-            if re.search(call_pattern, query.lower()):
-                # Extract phone number and message
-                phone_number = None
-                message = None
-                
-                # Try to extract phone number from query
-                phone_pattern = r'(\+?[\d\s\-\(\)]{10,})'
-                phone_matches = re.findall(phone_pattern, query)
-                if phone_matches:
-                    phone_number = phone_matches[0].strip()
-                else:
-                    # Try to find phone number in conversation history
-                    phone_number = self._extract_phone_number_from_history(thread_id)
-                
-                # Extract message content
-                message = self._extract_message_content(query)
-                
-                if phone_number:
-                    # Get call tool
-                    rag_tools = RAGTools()
-                    tools = rag_tools.get_tools()
-                    for tool in tools:
-                        if tool.name == "make_call":
-                            result = tool.invoke({"recipient": phone_number, "message": message})
-                            
-                            # Add to conversation history
-                            if thread_id not in self.conversation_history:
-                                self.conversation_history[thread_id] = []
-                            self.conversation_history[thread_id].append(HumanMessage(content=query))
-                            self.conversation_history[thread_id].append(AIMessage(
-                                content=f"✅ Call initiated to {phone_number} with message: '{message}'. {result}"
-                            ))
-                            
-                            return f"✅ Call initiated to {phone_number} with message: '{message}'. {result}"
-            
-            # Get or initialize in-memory conversation history for this thread
-            if thread_id not in self.conversation_history:
-                self.conversation_history[thread_id] = []
-            
-            # For existing threads, retrieve full conversation history from the database
-            detailed_conversation_history = []
-            if thread_id:
-                try:
-                    import requests
-                    
-                    # Retrieve the full conversation history from the database via API
-                    response = requests.get(f"http://localhost:8000/api/conversations/{thread_id}")
-                    if response.status_code == 200:
-                        detailed_conversation_history = response.json().get("messages", [])
-                except Exception as e:
-                    print(f"Error retrieving thread history: {str(e)}")
-                    # Fall back to in-memory history if database retrieval fails
-            
-            # Use database history if available, otherwise use in-memory history
-            if detailed_conversation_history:
-                messages = []
-                for msg in detailed_conversation_history:
-                    if msg.get("role") == "user":
-                        messages.append(HumanMessage(content=msg.get("content", "")))
-                    elif msg.get("role") == "assistant":
-                        messages.append(AIMessage(content=msg.get("content", "")))
+        # Lowercase once; the cheap `in` prefilter gates the regex so the
+        # vast majority of queries never hit the regex engine at all.
+        # A single alternation scan classifies the query in one pass
+        # instead of three sequential regex searches.
+        q_low = query.lower()
+        intent = None
+        if any(k in q_low for k in _INTENT_KEYWORDS):
+            intent_match = _INTENT_RE.search(query)
+            if intent_match:
+                intent = intent_match.lastgroup
+
+        # Check if this is a direct image generation request
+        if intent == "img":
+            # Extract the image description
+            description_start = q_low.find("image of") + 8
+            if description_start > 8:  # Found "image of"
+                image_description = query[description_start:].strip()
+                # If the description ends with punctuation, remove it
+                image_description = re.sub(r'[.!?]$', '', image_description)
+
+                if image_description:
+                    # Call the direct image generation method
+                    return self.generate_image_directly(image_description)
+
+        # Special handling for SMS requests
+        if intent == "sms":
+            # Extract phone number and message
+            phone_number = None
+            message = None
+
+            # Try to extract phone number from query
+            phone_matches = _PHONE_RE.findall(query)
+            if phone_matches:
+                phone_number = phone_matches[0].strip()
             else:
-                # Use in-memory history as fallback
-                messages = self.conversation_history.get(thread_id, [])
-            
-            # Process messages to get conversation context
-            conversation_history = RAGWorkflow.process_messages(messages)
-            
-            # Get the latest message or create a new one for first message
-            if messages:
-                latest_message = messages[-1]
+                # Try to find phone number in conversation history
+                phone_number = self._extract_phone_number_from_history(thread_id)
+
+            # Extract message content
+            message = self._extract_message_content(query)
+
+            if phone_number and message:
+                # Use the cached SMS tool (O(1) lookup, no toolchain rebuild)
+                sms_tool = self.tools.get("send_sms")
+                if sms_tool:
+                    result = sms_tool.invoke({"recipient": phone_number, "message": message})
+
+                    # Add to conversation history
+                    self.conversation_history[thread_id].append(HumanMessage(content=query))
+                    self.conversation_history[thread_id].append(AIMessage(
+                        content=f"✅ SMS sent to {phone_number} with message: '{message}'. {result}"
+                    ))
+
+                    return f"✅ SMS sent to {phone_number} with message: '{message}'. {result}"
+
+        # Special handling for call requests
+        if intent == "call":
+            # Extract phone number and message
+            phone_number = None
+            message = None
+
+            # Try to extract phone number from query
+            phone_matches = _PHONE_RE.findall(query)
+            if phone_matches:
+                phone_number = phone_matches[0].strip()
             else:
-                # For the first message in a conversation, create a mock message with the current query
-                latest_message = HumanMessage(content=query)
+                # Try to find phone number in conversation history
+                phone_number = self._extract_phone_number_from_history(thread_id)
 
-            # Create system prompt with full conversation history
-            system_prompt = RAGWorkflow.create_system_prompt(
-                latest_message=latest_message,
-                conversation_history=conversation_history,
-                image_content=attached_images
-            )
-            
-            # Add explicit instructions for SMS and calling
-            system_prompt += "\n\nIMPORTANT: When asked to send an SMS or make a call, use the appropriate tool (send_sms or make_call) directly. Do not hesitate to use these tools when explicitly requested."
-            
-            # Add enhanced search instructions
-            system_prompt += "\n\nWhen using the search_web tool to respond to queries about news, events, or information:"
-            system_prompt += "\n1. Always find at least 5 relevant sources from diverse websites"
-            system_prompt += "\n2. Structure your response with a clear, well-organized summary of key findings"
-            system_prompt += "\n3. List all 5 sources with proper links at the end of your response"
-            system_prompt += "\n4. Prefer recent sources when available"
-            system_prompt += "\n5. Present information in a factual, balanced way, highlighting agreements and differences between sources"
-            
-            # Add memory context reminder
-            system_prompt += "\n\nIMPORTANT: You have access to the full conversation history. Reference previous parts of the conversation when relevant and maintain continuity by referring to previous questions and answers."
-            
-            # Augment system prompt with project context if available
-            if project_context:
-                project_context_str = "\n\nProject Context:\n"
-                for key, value in project_context.items():
-                    project_context_str += f"{key}: {value}\n"
-                system_prompt += project_context_str
-            
-            # Augment system prompt with image context if available
-            if image_context:
-                system_prompt += f"\n\nImage Context:\n{image_context}\n"
-            
-            # Add mode-specific instructions
-            if mode == "setup":
-                system_prompt += "\nYou are in SETUP mode. Focus on helping the user configure systems, services, or applications. Provide detailed step-by-step instructions. When appropriate, suggest best practices for configuration."
-            elif mode == "explore":
-                system_prompt += "\nYou are in EXPLORE mode. Focus on helping the user discover information and learn new things. Be comprehensive and educational in your responses."
-            
-            # Get tools
-            rag_tools = RAGTools()
-            tools = rag_tools.get_tools()
-
-            # Initialize LLM with tools explicitly bound
-            self.llm = ChatOpenAI(
-                model="gpt-4o",
-                temperature=0.7,
-                openai_api_key=self.openai_api_key
-            ).bind_tools(tools)  # Explicitly bind tools
-            
-            # Create prompt using tuple format instead of message objects to fix template issues
+            # Extract message content
+            message = self._extract_message_content(query)
+
+            if phone_number:
+                # Use the cached call tool (O(1) lookup, no toolchain rebuild)
+                call_tool = self.tools.get("make_call")
+                if call_tool:
+                    result = call_tool.invoke({"recipient": phone_number, "message": message})
+
+                    # Add to conversation history
+                    self.conversation_history[thread_id].append(HumanMessage(content=query))
+                    self.conversation_history[thread_id].append(AIMessage(
+                        content=f"✅ Call initiated to {phone_number} with message: '{message}'. {result}"
+                    ))
+
+                    return f"✅ Call initiated to {phone_number} with message: '{message}'. {result}"
+
+        # Not a direct request, let the agent handle it
+        return None
+
+    def _prepare_agent(self, query: str, thread_id: str, mode: str,
+                       project_context: dict, image_context: str,
+                       attached_images: list):
+        """
+        Build the agent executor and chat history for a query.
+
+        Shared by get_answer (blocking) and stream_answer (streaming).
+
+        Returns:
+            A tuple of (agent_executor, agent_inputs) ready to invoke/stream
+        """
+        # For existing threads, retrieve full conversation history from the database
+        detailed_conversation_history = []
+        if thread_id:
+            try:
+                # Retrieve the full conversation history from the database via API
+                # using the pooled client so warm connections are reused
+                response = self._http.get(f"/api/conversations/{thread_id}")
+                if response.status_code == 200:
+                    # Decode straight from the response bytes; long threads
+                    # produce bodies where the stdlib decoder is measurable
+                    if orjson is not None:
+                        body = orjson.loads(response.content)
+                    else:
+                        body = response.json()
+                    detailed_conversation_history = body.get("messages", [])
+            except httpx.TimeoutException:
+                print(f"Timed out retrieving thread history for {thread_id}, using in-memory history")
+            except Exception as e:
+                print(f"Error retrieving thread history: {str(e)}")
+                # Fall back to in-memory history if database retrieval fails
+        
+        # Use database history if available, otherwise use in-memory history
+        if detailed_conversation_history:
+            messages = []
+            for msg in detailed_conversation_history:
+                if msg.get("role") == "user":
+                    messages.append(HumanMessage(content=msg.get("content", "")))
+                elif msg.get("role") == "assistant":
+                    messages.append(AIMessage(content=msg.get("content", "")))
+        else:
+            # Use in-memory history as fallback
+            messages = self.conversation_history.get(thread_id, [])
+        
+        # Process messages to get conversation context
+        conversation_history = RAGWorkflow.process_messages(messages)
+        
+        # Get the latest message or create a new one for first message
+        if messages:
+            latest_message = messages[-1]
+        else:
+            # For the first message in a conversation, create a mock message with the current query
+            latest_message = HumanMessage(content=query)
+
+        # Create system prompt with full conversation history
+        system_prompt = RAGWorkflow.create_system_prompt(
+            latest_message=latest_message,
+            conversation_history=conversation_history,
+            image_content=attached_images
+        )
+        
+        # Add the precomputed static instruction blocks (SMS/call usage,
+        # search formatting, memory reminder)
+        system_prompt += self._static_prompt_suffix
+
+        # Augment system prompt with project context if available
+        if project_context:
+            project_context_str = "\n\nProject Context:\n"
+            for key, value in project_context.items():
+                project_context_str += f"{key}: {value}\n"
+            system_prompt += project_context_str
+        
+        # Augment system prompt with image context if available
+        if image_context:
+            system_prompt += f"\n\nImage Context:\n{image_context}\n"
+        
+        # Add mode-specific instructions
+        system_prompt += self._mode_suffixes.get(mode, "")
+
+        # The prompt template, agent and executor are identical for every
+        # request once the system prompt is fed in as an input variable, so
+        # they are built once and the executor reused. Passing the prompt as
+        # a variable also keeps literal braces in history/context text from
+        # being treated as template placeholders.
+        if self._agent_executor is None:
             prompt = ChatPromptTemplate.from_messages([
-                ("system", system_prompt),
+                ("system", "{system_prompt}"),
                 MessagesPlaceholder(variable_name="chat_history"),
                 ("human", "{input}"),  # Changed format to tuple
                 MessagesPlaceholder(variable_name="agent_scratchpad")
             ])
-            
-            # Create agent
-            agent = create_openai_tools_agent(self.llm, tools, prompt)
-            
+
+            # Create agent with the cached toolchain and pre-bound LLM
+            agent = create_openai_tools_agent(self._llm_with_tools, self.toolchain, prompt)
+
             # Create agent executor with return_intermediate_steps for better debugging
-            agent_executor = AgentExecutor(
+            self._agent_executor = AgentExecutor(
                 agent=agent,
-                tools=tools,
+                tools=self.toolchain,
                 verbose=True,
                 handle_parsing_errors=True,
                 max_iterations=5,
                 return_intermediate_steps=True  # Add for better debugging
             )
-            
-            # Prepare chat history for the agent
-            # Use FULL history from database or in-memory
-            chat_history = []
-            for message in messages:
-                if isinstance(message, HumanMessage):
-                    chat_history.append({"role": "user", "content": message.content})
-                elif isinstance(message, AIMessage):
-                    chat_history.append({"role": "assistant", "content": message.content})
-            
+
+        # Prepare chat history for the agent
+        # Use FULL history from database or in-memory
+        chat_history = []
+        for message in messages:
+            if isinstance(message, HumanMessage):
+                chat_history.append({"role": "user", "content": message.content})
+            elif isinstance(message, AIMessage):
+                chat_history.append({"role": "assistant", "content": message.content})
+
+        agent_inputs = {
+            "input": query,
+            "chat_history": chat_history,
+            "system_prompt": system_prompt
+        }
+        return self._agent_executor, agent_inputs
+
+    def get_answer(self, query: str, thread_id: str = None, mode: str = "explore",
+                project_context: dict = None, image_context: str = None,
+                attached_images: list = None) -> str:
+        """
+        Get answer from the RAG system for a user query.
+
+        Args:
+            query: User question
+            thread_id: Optional thread ID for conversation continuity
+            mode: Mode for the RAG system (explore, setup, etc.)
+            project_context: Optional project context information
+            image_context: Optional context from analyzed images
+            attached_images: Optional list of attached image data
+
+        Returns:
+            Response from the system
+        """
+        try:
+            # Handle image/SMS/call requests without spinning up the agent
+            direct_response = self._handle_direct_request(query, thread_id)
+            if direct_response is not None:
+                return direct_response
+
+            # Check the semantic cache before doing any agent work; a
+            # repeated or near-duplicate query is answered from the cache
+            query_vec = None
+            try:
+                query_vec = self._embed_query(query)
+                cached_answer = self._semantic_cache_lookup(query_vec)
+                if cached_answer is not None:
+                    self.conversation_history[thread_id].append(HumanMessage(content=query))
+                    self.conversation_history[thread_id].append(AIMessage(content=cached_answer))
+                    return cached_answer
+            except Exception as e:
+                print(f"Semantic cache lookup failed: {str(e)}")
+
+            agent_executor, agent_inputs = self._prepare_agent(
+                query, thread_id, mode, project_context, image_context, attached_images
+            )
+
             # Run agent to get response
-            response = agent_executor.invoke({
-                "input": query,
-                "chat_history": chat_history
-            })
-            
+            response = agent_executor.invoke(agent_inputs)
+
             # Get output and intermediate steps for debugging if needed
             output = response.get("output", "I couldn't generate a response. Please try again.")
             steps = response.get("intermediate_steps", [])
@@ -533,19 +778,204 @@ class WebRAGSystem:
                 # Fallback response if template wasn't filled
                 output = "I apologize for the error in processing your request. Could you please rephrase your question?"
             
-            # Apply search results enhancement
-            if "search_web" in str(steps).lower():
+            # Apply search results enhancement (regex search skips the
+            # full lowercase copy of the stringified steps)
+            if _SEARCH_WEB_RE.search(str(steps)):
                 output = self._enhance_search_results_formatting(output)
             
             # Update conversation history
             self.conversation_history[thread_id].append(HumanMessage(content=query))
             self.conversation_history[thread_id].append(AIMessage(content=output))
-            
+
+            # Store the answer for future near-duplicate queries, but never
+            # the fallback texts — those come from transient failures
+            if query_vec is not None and output not in _UNCACHEABLE_OUTPUTS:
+                try:
+                    self._semantic_cache_store(query_vec, output)
+                except Exception as e:
+                    print(f"Semantic cache store failed: {str(e)}")
+
             # Return response
             return output
             
         except Exception as e:
-            import traceback
             error_message = f"Error processing query: {str(e)}\n{traceback.format_exc()}"
             print(error_message)
             return f"I encountered an error while processing your request: {str(e)}"
+
+    def stream_answer(self, query: str, thread_id: str = None, mode: str = "explore",
+                project_context: dict = None, image_context: str = None,
+                attached_images: list = None):
+        """
+        Stream the answer for a user query instead of blocking on the full response.
+
+        Yields chunks of the response as the agent produces them, so callers
+        (e.g. a StreamingResponse endpoint) can show partial output while tool
+        calls are still running. The accumulated output is stored in the
+        conversation history once the stream completes.
+
+        Args:
+            Same as get_answer.
+
+        Yields:
+            String chunks of the response.
+        """
+        try:
+            # Direct image/SMS/call requests produce their response in one shot
+            direct_response = self._handle_direct_request(query, thread_id)
+            if direct_response is not None:
+                yield direct_response
+                return
+
+            agent_executor, agent_inputs = self._prepare_agent(
+                query, thread_id, mode, project_context, image_context, attached_images
+            )
+
+            # Run the agent in a worker thread and forward LLM tokens through
+            # a queue, so output is yielded as the model decodes it instead of
+            # waiting for the terminal chunk (AgentExecutor.stream only emits
+            # the complete answer in its final {"output": ...} chunk)
+            token_queue = Queue()
+            result = {}
+
+            def run_agent():
+                try:
+                    result["response"] = agent_executor.invoke(
+                        agent_inputs,
+                        {"callbacks": [_QueueTokenHandler(token_queue)]}
+                    )
+                except Exception as e:
+                    result["error"] = e
+                finally:
+                    token_queue.put(_STREAM_DONE)
+
+            worker = Thread(target=run_agent, daemon=True)
+            worker.start()
+
+            streamed_parts = []
+            while True:
+                token = token_queue.get()
+                if token is _STREAM_DONE:
+                    break
+                streamed_parts.append(token)
+                yield token
+            worker.join()
+
+            if "error" in result:
+                raise result["error"]
+
+            output = result.get("response", {}).get("output", "")
+            if not output:
+                output = "".join(streamed_parts)
+            if not output:
+                output = "I couldn't generate a response. Please try again."
+                yield output
+
+            # Match get_answer: store the search-enhanced form so follow-up
+            # turns read the same text on both endpoints. Tokens already
+            # yielded can't be rewritten retroactively, so the live stream
+            # carries the raw output.
+            steps = result.get("response", {}).get("intermediate_steps", [])
+            if _SEARCH_WEB_RE.search(str(steps)):
+                output = self._enhance_search_results_formatting(output)
+
+            # Update conversation history with the accumulated output
+            self.conversation_history[thread_id].append(HumanMessage(content=query))
+            self.conversation_history[thread_id].append(AIMessage(content=output))
+
+        except Exception as e:
+            error_message = f"Error processing query: {str(e)}\n{traceback.format_exc()}"
+            print(error_message)
+            yield f"I encountered an error while processing your request: {str(e)}"
+
+    def get_answer_batch(self, queries: list, use_batch_api: bool = True,
+                         completion_window: str = "24h",
+                         poll_interval: float = 10.0,
+                         timeout: float = 3600.0) -> list:
+        """
+        Answer a list of queries in bulk via the OpenAI Batch API.
+
+        Intended for non-interactive flows (evaluation scripts, backfills)
+        where latency doesn't matter: batched requests cost half as much as
+        the real-time endpoint. Falls back to sequential get_answer calls if
+        the batch API is disabled, fails, or doesn't finish in time.
+
+        Args:
+            queries: List of user questions to answer
+            use_batch_api: Set False to force sequential online processing
+            completion_window: Batch API completion window (currently "24h")
+            poll_interval: Seconds between batch status polls
+            timeout: Seconds to wait for the batch before falling back
+
+        Returns:
+            A list of answers, one per query, in the same order
+        """
+        if not use_batch_api:
+            return [self.get_answer(q) for q in queries]
+
+        try:
+            client = OpenAI(api_key=self.openai_api_key)
+
+            # One chat-completions request per query, newline-delimited
+            lines = []
+            for i, q in enumerate(queries):
+                lines.append(json.dumps({
+                    "custom_id": f"query-{i}",
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": "gpt-4o",
+                        "temperature": 0.7,
+                        "messages": [
+                            {"role": "system", "content": "You are a helpful assistant that answers questions accurately and concisely."},
+                            {"role": "user", "content": q}
+                        ]
+                    }
+                }))
+            payload = "\n".join(lines).encode("utf-8")
+
+            # Upload the JSONL and create the batch
+            batch_file = client.files.create(file=io.BytesIO(payload), purpose="batch")
+            batch = client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window=completion_window
+            )
+
+            # Poll until the batch finishes or the timeout expires
+            deadline = time.time() + timeout
+            while time.time() < deadline:
+                batch = client.batches.retrieve(batch.id)
+                if batch.status == "completed":
+                    break
+                if batch.status in ("failed", "expired", "cancelled"):
+                    print(f"Batch {batch.id} ended with status {batch.status}, falling back to online processing")
+                    return [self.get_answer(q) for q in queries]
+                time.sleep(poll_interval)
+            else:
+                print(f"Batch {batch.id} did not finish within {timeout}s, falling back to online processing")
+                return [self.get_answer(q) for q in queries]
+
+            # Map results back into query order via custom_id
+            output_text = client.files.content(batch.output_file_id).text
+            answers = [None] * len(queries)
+            for line in output_text.splitlines():
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                index = int(result["custom_id"].split("-")[1])
+                response_body = (result.get("response") or {}).get("body") or {}
+                choices = response_body.get("choices") or []
+                if choices:
+                    answers[index] = choices[0]["message"]["content"]
+
+            # Any requests that errored inside the batch go through online
+            for i, answer in enumerate(answers):
+                if answer is None:
+                    answers[i] = self.get_answer(queries[i])
+
+            return answers
+
+        except Exception as e:
+            print(f"Batch API processing failed: {str(e)}, falling back to online processing")
+            return [self.get_answer(q) for q in queries]